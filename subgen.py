@@ -6,103 +6,547 @@ SubGen - A CLI tool to generate subtitles for video files using Whisper
 import os
 import sys
 import argparse
+import atexit
+import importlib.util
+import io
+import itertools
+import logging
+import logging.handlers
+import queue
+import shutil
 import subprocess
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Set
+from typing import Iterator, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger('subgen')
 
 # Common video file extensions
-VIDEO_EXTENSIONS = {
+VIDEO_EXTENSIONS = frozenset({
     '.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', 
     '.m4v', '.3gp', '.ogv', '.ts', '.mts', '.m2ts'
+})
+
+# Video file extensions as bytes, for matching raw directory entry names
+VIDEO_EXTENSIONS_BYTES = frozenset(ext.encode() for ext in VIDEO_EXTENSIONS)
+
+# Last bytes (in either case) of the names of video and subtitle files, to
+# cheaply reject most other files before looking at their suffix
+SUFFIX_LAST_BYTES = frozenset(
+    byte for ext in VIDEO_EXTENSIONS_BYTES | {b'.srt'}
+    for byte in (ext.lower()[-1], ext.upper()[-1])
+)
+
+# Approximate GPU memory (in MiB) needed by one Whisper job for each model
+# with int8 weights
+MODEL_VRAM_MB = {
+    'tiny': 512, 'base': 768, 'small': 1536, 'medium': 2560,
+    'large': 4096, 'large-v1': 4096, 'large-v2': 4096, 'large-v3': 4096,
 }
 
-def find_video_files(directory: Path) -> List[Path]:
+# Approximate extra GPU memory (in MiB) needed per audio chunk in a batch
+BATCH_VRAM_MB = 384
+
+# Sample rate (in Hz) of the audio fed to Whisper
+SAMPLE_RATE = 16000
+
+# Length (in seconds) of the audio window transcribed at a time, so memory
+# use stays flat regardless of video length
+WINDOW_SECONDS = 600
+
+class Subtitle(NamedTuple):
+    """A transcribed segment with timestamps relative to the whole video"""
+    start: float
+    end: float
+    text: str
+
+# Default number of directories scanned concurrently when searching for videos
+SCAN_WORKERS = 8
+
+def _scan_directory(directory: bytes, skip_existing: bool = False
+                    ) -> Tuple[List[Path], List[Path], List[Tuple[bytes, Tuple[int, int]]]]:
     """
-    Recursively find all video files in the given directory.
+    Scan a single directory for video files and subdirectories.
+    
+    Works on the raw bytes directory entries so that names are never
+    decoded, and a Path is only built for files that turn out to be videos.
+    Subdirectories are returned in inode order; callers sort the final
+    results by name.
     
     Args:
-        directory: Path to the directory to search
+        directory: Path of the directory to scan, as bytes
+        skip_existing: Set aside videos with a subtitle file next to them
         
     Returns:
-        List of Path objects for video files found, sorted alphabetically
+        Tuple of (video files found, video files set aside because they
+        already have subtitles, subdirectories still to be scanned as
+        (path, (st_dev, st_ino)) pairs)
     """
-    video_files = []
+    candidates = []
+    subdirs = []
+    # Names are compared case-insensitively, so movie.SRT counts as a
+    # subtitle for movie.mp4 just as it would on a case-insensitive filesystem
+    subtitle_stems = set()
     
     try:
-        for root, dirs, files in os.walk(directory):
-            # Sort directories and files for consistent ordering
-            dirs.sort()
-            files.sort()
-            for file in files:
-                file_path = Path(root) / file
-                if file_path.suffix.lower() in VIDEO_EXTENSIONS:
-                    video_files.append(file_path)
+        # Visit entries in inode order so that any stat needed by is_dir() or
+        # is_file() walks the inode table sequentially instead of seeking
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=os.DirEntry.inode)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                subdirs.append((entry.path, (stat.st_dev, stat.st_ino)))
+                continue
+            # Slice the suffix straight off the name and only check that
+            # the entry is a file once it looks like a video
+            name = entry.name
+            if name[-1] not in SUFFIX_LAST_BYTES:
+                continue
+            dot = name.rfind(b'.')
+            if dot <= 0:
+                continue
+            suffix = name[dot:].lower()
+            if suffix == b'.srt':
+                subtitle_stems.add(name[:dot].lower())
+            elif suffix in VIDEO_EXTENSIONS_BYTES and entry.is_file():
+                candidates.append((name[:dot], entry.path))
     except PermissionError as e:
-        print(f"Warning: Permission denied accessing {e.filename}")
-    except Exception as e:
-        print(f"Error scanning directory: {e}")
+        logger.warning(f"Warning: Permission denied accessing {os.fsdecode(e.filename)}")
+    except OSError as e:
+        # The directory may have been removed or become unreadable since its
+        # parent was scanned; keep whatever it produced and carry on
+        logger.warning(f"Warning: Could not read {os.fsdecode(e.filename or directory)}: {e.strerror}")
+    
+    # The directory listing already says which videos have subtitles, so
+    # no extra stat is needed to filter them
+    video_files = []
+    skipped_files = []
+    for stem, path in candidates:
+        if skip_existing and stem.lower() in subtitle_stems:
+            skipped_files.append(Path(os.fsdecode(path)))
+        else:
+            video_files.append(Path(os.fsdecode(path)))
         
-    # Sort the final list of video files alphabetically
-    video_files.sort()
-    return video_files
+    return video_files, skipped_files, subdirs
+
+def find_video_files(directory: Path, workers: int = SCAN_WORKERS,
+                     skip_existing: bool = False,
+                     stop: Optional[threading.Event] = None) -> Iterator[Tuple[Path, bool]]:
+    """
+    Recursively find all video files in the given directory.
+    
+    Directories are scanned in parallel: every scanned directory submits its
+    subdirectories back to the pool, and results are merged by the caller
+    so workers never contend on a shared list. Directories are identified by
+    device and inode so that one reachable twice, e.g. through a bind
+    mount, is only scanned once.
+    
+    Videos are yielded as soon as their directory has been scanned, so they
+    can be processed while the rest of the tree is still being walked.
+    
+    Args:
+        directory: Path to the directory to search
+        workers: Number of directories read concurrently
+        skip_existing: Set aside videos that already have a subtitle file
+        stop: Event that, once set, ends the scan and cancels the
+            directories still queued
+        
+    Yields:
+        Tuples of (video file, whether it was set aside because it already
+        has subtitles), sorted alphabetically within each directory
+    """
+    try:
+        stat = os.stat(directory)
+    except OSError as e:
+        logger.error(f"Error scanning directory {directory}: {e.strerror}")
+        return
+    
+    # Errors in individual directories are reported by _scan_directory,
+    # which still returns whatever it found so the scan carries on
+    seen = {(stat.st_dev, stat.st_ino)}
+    stop = stop or threading.Event()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {executor.submit(_scan_directory, os.fsencode(directory), skip_existing)}
+        while pending and not stop.is_set():
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, skipped, subdirs = future.result()
+                if stop.is_set():
+                    return
+                # Queue the subdirectories before handing out any videos
+                # so scanning carries on while they are processed
+                for subdir, key in subdirs:
+                    if key not in seen:
+                        seen.add(key)
+                        pending.add(executor.submit(_scan_directory, subdir, skip_existing))
+                for video_file in sorted(skipped):
+                    yield video_file, True
+                for video_file in sorted(files):
+                    yield video_file, False
+    finally:
+        # Don't hold up the exit on directories nobody is waiting for
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def scan_in_background(found: Iterator[Tuple[Path, bool]]) -> Iterator[Tuple[Path, bool]]:
+    """
+    Drive a find_video_files scan on its own thread.
+    
+    The scan keeps going however long the consumer takes between items,
+    e.g. while the model is loading, instead of pausing at every yield.
+    
+    Args:
+        found: Generator returned by find_video_files
+        
+    Yields:
+        The items produced by the scan, in the same order
+    """
+    results = queue.Queue()
+    finished = object()
+    
+    def run() -> None:
+        try:
+            for item in found:
+                results.put(item)
+        finally:
+            results.put(finished)
+    
+    threading.Thread(target=run, name='subgen-scan', daemon=True).start()
+    while True:
+        item = results.get()
+        if item is finished:
+            return
+        yield item
 
 def check_whisper_installed() -> bool:
     """
-    Check if Whisper CLI is installed and available.
+    Check if faster-whisper is installed and available.
+    
+    Returns:
+        True if faster-whisper is available, False otherwise
+    """
+    return importlib.util.find_spec('faster_whisper') is not None
+
+def check_ffmpeg_installed() -> bool:
+    """
+    Check if the FFmpeg CLI is installed and available.
     
     Returns:
-        True if Whisper is available, False otherwise
+        True if FFmpeg is available, False otherwise
+    """
+    return shutil.which('ffmpeg') is not None
+
+def get_gpu_slots(model: str, batch_size: int = 1) -> List[int]:
+    """
+    Work out which GPUs Whisper jobs can run on.
+    
+    Each GPU gets as many slots as concurrent jobs fit in its free memory,
+    counting the model plus the activations of a full batch per job.
+    Slots are interleaved across GPUs so that jobs are spread round-robin
+    before any GPU is shared.
+    
+    nvidia-smi always reports every GPU by its physical index, so when
+    CUDA_VISIBLE_DEVICES is set only the GPUs it lists are used, numbered
+    by their position in it as CUDA numbers them.
+    
+    Args:
+        model: Whisper model that will be used
+        batch_size: Number of audio chunks transcribed together by each job
+        
+    Returns:
+        List of CUDA device indices, one entry per job slot; empty if no
+        GPU was found
     """
     try:
-        result = subprocess.run(['whisper', '--help'], 
+        result = subprocess.run(['nvidia-smi', '--query-gpu=index,uuid,memory.free',
+                                 '--format=csv,noheader,nounits'],
                               capture_output=True, text=True, timeout=10)
-        return result.returncode == 0
     except (subprocess.TimeoutExpired, FileNotFoundError):
-        return False
+        return []
+    
+    if result.returncode != 0:
+        return []
+    
+    gpus = []
+    for line in result.stdout.splitlines():
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) == 3 and fields[0].isdigit() and fields[2].isdigit():
+            gpus.append((fields[0], fields[1], int(fields[2])))
+    
+    visible = os.environ.get('CUDA_VISIBLE_DEVICES')
+    if visible is None:
+        free_mb = {int(index): free for index, _, free in gpus}
+    else:
+        # Entries are physical indices or (prefixes of) GPU UUIDs; CUDA
+        # ignores everything from the first entry that matches no GPU
+        free_mb = {}
+        for entry in visible.split(','):
+            entry = entry.strip()
+            match = next((free for index, uuid, free in gpus
+                          if entry == index or (entry.startswith('GPU-') and uuid.startswith(entry))),
+                         None)
+            if match is None:
+                break
+            free_mb[len(free_mb)] = match
+    
+    job_mb = MODEL_VRAM_MB[model] + batch_size * BATCH_VRAM_MB
+    slots_per_gpu = {gpu: max(1, free // job_mb) for gpu, free in free_mb.items()}
+    
+    slots = []
+    for round_index in range(max(slots_per_gpu.values(), default=0)):
+        slots.extend(gpu for gpu, count in slots_per_gpu.items() if count > round_index)
+    return slots
 
-def generate_subtitle(video_path: Path, model: str = "large-v3", language: str = None) -> bool:
+def load_model(model: str, gpu_ids: List[int], workers_per_device: int = 1,
+               batch_size: int = 1):
+    """
+    Load a Whisper model once so it can be reused for every video.
+    
+    Weights are quantized to int8, which roughly halves their memory
+    footprint and bandwidth. Concurrent transcriptions are dispatched by
+    CTranslate2 across the given GPUs.
+    
+    Args:
+        model: Whisper model to use (tiny, base, small, medium, large)
+        gpu_ids: CUDA indices of the GPUs to run on; runs on the CPU if empty
+        workers_per_device: Number of transcriptions that can run at once on each device
+        batch_size: Number of audio chunks transcribed together
+        
+    Returns:
+        Loaded WhisperModel, wrapped in a BatchedInferencePipeline when
+        batch_size is greater than 1
+    """
+    # Imported here as loading faster-whisper and its dependencies takes far
+    # longer than everything else needed to scan or print help
+    from faster_whisper import BatchedInferencePipeline, WhisperModel
+    
+    if gpu_ids:
+        # Number GPUs the same way as nvidia-smi
+        os.environ.setdefault('CUDA_DEVICE_ORDER', 'PCI_BUS_ID')
+        whisper_model = WhisperModel(model, device='cuda', device_index=gpu_ids,
+                                     compute_type='int8_float16',
+                                     num_workers=workers_per_device)
+    else:
+        whisper_model = WhisperModel(model, device='cpu', compute_type='int8',
+                                     num_workers=workers_per_device)
+    
+    if batch_size > 1:
+        # Chunks of each video are decoded as one batch, amortizing the
+        # encoder cost over many chunks per kernel launch
+        return BatchedInferencePipeline(model=whisper_model)
+    return whisper_model
+
+def format_timestamp(seconds: float) -> str:
+    """
+    Format a time offset as an SRT timestamp.
+    
+    Args:
+        seconds: Time offset in seconds
+        
+    Returns:
+        Timestamp in HH:MM:SS,mmm format
+    """
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+def write_srt(segments, srt_path: Path) -> None:
+    """
+    Write transcribed segments to an SRT subtitle file.
+    
+    The whole file is built in memory and written with a single call to a
+    temporary file, which then replaces the subtitle file so that it is
+    never seen half-written.
+    
+    Args:
+        segments: Transcribed segments with start, end and text attributes
+        srt_path: Path of the subtitle file to write
+    """
+    buffer = io.StringIO()
+    for index, segment in enumerate(segments, start=1):
+        buffer.write(f"{index}\n"
+                     f"{format_timestamp(segment.start)} --> {format_timestamp(segment.end)}\n"
+                     f"{segment.text.strip()}\n\n")
+    
+    # A unique name keeps jobs for videos sharing a stem (e.g. movie.mkv and
+    # movie.mp4) from writing to the same temporary file. Creating it with
+    # mode 0o666 lets the kernel apply the umask as for any new file
+    temp_path = srt_path.with_name(f"{srt_path.name}.{uuid.uuid4().hex}.tmp")
+    fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(buffer.getvalue())
+        # Keep the permissions of a subtitle file being overridden
+        try:
+            os.chmod(temp_path, os.stat(srt_path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, srt_path)
+    except OSError:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+def load_audio(video_path: Path) -> "np.ndarray":
+    """
+    Decode the audio track of a video with FFmpeg.
+    
+    Only the audio stream is decoded, straight to mono PCM at the sample
+    rate Whisper expects, and piped back without touching the disk.
+    
+    Args:
+        video_path: Path to the video file
+        
+    Returns:
+        Mono float32 audio samples at SAMPLE_RATE
+        
+    Raises:
+        RuntimeError: If FFmpeg fails to decode the audio
+    """
+    import numpy as np
+    
+    cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-i', str(video_path),
+        '-vn', '-sn', '-dn',
+        '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(SAMPLE_RATE),
+        '-',
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg failed to decode audio: {result.stderr.decode(errors='replace').strip()}")
+    
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+def transcribe_windowed(model, audio, language: str = None, **options) -> List[Subtitle]:
+    """
+    Transcribe audio in fixed-length windows.
+    
+    The final segment of every window but the last may be cut off at the
+    window edge, so it is dropped and the next window starts where the last
+    kept segment ended, as long as that is at least half a window further
+    on; otherwise the segment is kept and the next window starts at the
+    edge. The language detected in the first window is reused
+    for the rest so that it stays consistent across the video.
+    
+    Args:
+        model: Loaded WhisperModel or BatchedInferencePipeline
+        audio: Mono audio samples at SAMPLE_RATE
+        language: Language to use for transcription (optional, auto-detect if None)
+        **options: Extra keyword arguments passed to model.transcribe
+        
+    Returns:
+        List of subtitles covering the whole audio
+    """
+    window = WINDOW_SECONDS * SAMPLE_RATE
+    subtitles = []
+    start = 0
+    
+    while start < len(audio):
+        end = min(start + window, len(audio))
+        segments, info = model.transcribe(audio[start:end], language=language, **options)
+        segments = list(segments)
+        language = language or info.language
+        
+        # Only retry the tail if that still moves the window on by at least
+        # half its length, e.g. not when a short line is followed by minutes
+        # of music, which would mean transcribing nearly the same audio again
+        next_start = end
+        if end < len(audio) and len(segments) > 1:
+            retry_start = start + int(segments[-2].end * SAMPLE_RATE)
+            if retry_start - start >= window // 2:
+                segments.pop()
+                next_start = retry_start
+        
+        offset = start / SAMPLE_RATE
+        subtitles.extend(Subtitle(segment.start + offset, segment.end + offset, segment.text)
+                         for segment in segments)
+        start = next_start
+    
+    return subtitles
+
+def generate_subtitle(video_path: Path, model, language: str = None,
+                      batch_size: int = 1,
+                      gpu_semaphore: Optional[threading.Semaphore] = None) -> bool:
     """
     Generate subtitle file for a video using Whisper.
     
+    The subtitle file is created in the same directory as the video, with
+    the same name and an .srt extension.
+    
     Args:
         video_path: Path to the video file
-        model: Whisper model to use (tiny, base, small, medium, large)
+        model: Loaded WhisperModel, or a BatchedInferencePipeline wrapping it
+            when batch_size is greater than 1; shared between all videos
         language: Language to use for transcription (optional, auto-detect if None)
+        batch_size: Number of audio chunks transcribed together
+        gpu_semaphore: Semaphore held only while transcribing, so audio
+            decoding and subtitle writing of other jobs can overlap with it
         
     Returns:
         True if successful, False otherwise
     """
     try:
-        # Whisper will automatically create subtitle files in the same directory
-        # with the same name as the video file
-        cmd = [
-            'whisper',
-            str(video_path),
-            '--model', model,
-            '--output_dir', str(video_path.parent),
-            '--output_format', 'srt',
-            #'--device', 'mps'
-        ]
-        
-        # Add language parameter if specified
-        if language:
-            cmd.extend(['--language', language])
-        
-        print(f"Processing: {video_path.name}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print(f"✓ Generated subtitles for: {video_path.name}")
-            return True
-        else:
-            print(f"✗ Failed to generate subtitles for: {video_path.name}")
-            print(f"Error: {result.stderr}")
-            return False
+        logger.info(f"Processing: {video_path.name}")
+        
+        # All segments are collected before touching the subtitle file so a
+        # failure never leaves a partial one behind
+        audio = load_audio(video_path)
+        # The batched pipeline skips timestamp tokens by default, leaving one
+        # cue per VAD chunk of up to 30 seconds; keep them for subtitle-sized cues
+        options = {'batch_size': batch_size, 'without_timestamps': False} if batch_size > 1 else {}
+        with gpu_semaphore or nullcontext():
+            subtitles = transcribe_windowed(model, audio, language, **options)
+        
+        write_srt(subtitles, video_path.with_suffix('.srt'))
+        logger.info(f"✓ Generated subtitles for: {video_path.name}")
+        return True
             
     except Exception as e:
-        print(f"✗ Error processing {video_path.name}: {e}")
+        logger.error(f"✗ Error processing {video_path.name}: {e}")
         return False
 
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Send log messages to stdout through a background thread.
+    
+    Worker threads only put records on a queue, so they never block or
+    contend on stdout while writing progress messages.
+    
+    Returns:
+        Started QueueListener writing the queued messages to stdout
+    """
+    log_queue = queue.Queue(-1)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+def flush_logging(listener: logging.handlers.QueueListener) -> None:
+    """
+    Wait until all queued log messages have been written.
+    
+    Args:
+        listener: QueueListener returned by setup_logging
+    """
+    listener.stop()
+    listener.start()
+
 def create_argument_parser() -> argparse.ArgumentParser:
     """
     Create and configure the command-line argument parser.
@@ -118,6 +562,8 @@ Examples:
   %(prog)s /path/to/videos
   %(prog)s /path/to/videos --model small
   %(prog)s /path/to/videos --model medium --override-existing
+  %(prog)s /path/to/videos --preview
+  %(prog)s /path/to/videos --model small --jobs 4
         """
     )
     
@@ -145,94 +591,216 @@ Examples:
         help='Show what would be processed without actually generating subtitles'
     )
     
+    parser.add_argument(
+        '--preview', '-p',
+        action='store_true',
+        help='Finish scanning and list the videos to process, asking for confirmation before starting '
+             '(default: start processing videos as soon as they are found)'
+    )
+    
     parser.add_argument(
         '--language', '-l',
         help='Language for transcription (e.g., en, es, fr, de, etc.). If not specified, Whisper will auto-detect the language.'
     )
     
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Number of videos to process concurrently; one extra worker decodes the next video\'s audio ahead, '
+             'so up to --jobs + 1 videos may be in progress at once (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--gpu-slots',
+        type=int,
+        help='Number of videos transcribed at once, at most --jobs and capped by available GPU memory; '
+             'other jobs decode audio and write subtitles meanwhile (default: same as --jobs)'
+    )
+    
+    parser.add_argument(
+        '--batch-size', '-b',
+        type=int,
+        default=8,
+        help='Number of audio chunks of a video transcribed together on the GPU; 1 disables batching (default: 8)'
+    )
+    
+    parser.add_argument(
+        '--scan-threads',
+        type=int,
+        default=SCAN_WORKERS,
+        help=f'Number of directories read concurrently while searching for videos (default: {SCAN_WORKERS})'
+    )
+    
     return parser
 
 def main():
     """Main CLI function"""
     parser = create_argument_parser()
     args = parser.parse_args()
+    listener = setup_logging()
+    
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    
+    if args.gpu_slots is not None and args.gpu_slots < 1:
+        parser.error("--gpu-slots must be at least 1")
+    
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    
+    if args.scan_threads < 1:
+        parser.error("--scan-threads must be at least 1")
     
     # Validate directory
     directory = Path(args.directory)
     if not directory.exists():
-        print(f"Error: Directory '{directory}' does not exist")
+        logger.error(f"Error: Directory '{directory}' does not exist")
         sys.exit(1)
         
     if not directory.is_dir():
-        print(f"Error: '{directory}' is not a directory")
+        logger.error(f"Error: '{directory}' is not a directory")
         sys.exit(1)
     
     # Check if Whisper is installed
     if not args.dry_run and not check_whisper_installed():
-        print("Error: Whisper CLI is not installed or not in PATH")
-        print("Install it with: pip install openai-whisper")
+        logger.error("Error: faster-whisper is not installed")
+        logger.error("Install it with: pip install faster-whisper")
         sys.exit(1)
     
-    # Find video files
-    print(f"Scanning for video files in: {directory}")
-    video_files = find_video_files(directory)
+    if not args.dry_run and not check_ffmpeg_installed():
+        logger.error("Error: FFmpeg is not installed or not in PATH")
+        sys.exit(1)
     
-    if not video_files:
-        print("No video files found")
-        sys.exit(0)
+    # Set on every way out of main() so a scan still running in the
+    # background doesn't delay the exit
+    scan_stop = threading.Event()
+    try:
+        # Find video files
+        logger.info(f"Scanning for video files in: {directory}")
+        found = find_video_files(directory, args.scan_threads,
+                                 skip_existing=not args.override_existing, stop=scan_stop)
+        skipped_files = []
     
-    print(f"Found {len(video_files)} video file(s)")
+        if args.preview or args.dry_run:
+            # Wait for the whole scan so the full list can be reviewed first
+            video_files = []
+            for video_file, has_subtitle in found:
+                (skipped_files if has_subtitle else video_files).append(video_file)
+            video_files.sort()
+            skipped_files.sort()
+        
+            if not video_files and not skipped_files:
+                logger.info("No video files found")
+                sys.exit(0)
+        
+            logger.info(f"Found {len(video_files) + len(skipped_files)} video file(s)")
+        
+            # Files that already have subtitles were set aside during the scan
+            # (default behavior)
+            for video_file in skipped_files:
+                logger.info(f"Skipping {video_file.name} (subtitle already exists)")
+        
+            if not video_files:
+                logger.info("All video files already have subtitles")
+                logger.info("Use --override-existing to regenerate existing subtitles")
+                sys.exit(0)
+        
+            # Show what will be processed
+            logger.info(f"\nWill process {len(video_files)} video file(s) with model '{args.model}':")
+            for video_file in video_files:
+                logger.info(f"  - {video_file}")
+        
+            if args.dry_run:
+                logger.info("\nDry run complete - no subtitles were generated")
+                sys.exit(0)
+        
+            # Confirm processing
+            if len(video_files) > 1:
+                flush_logging(listener)
+                response = input(f"\nProceed with generating subtitles? [y/N]: ")
+                if response.lower() not in ['y', 'yes']:
+                    logger.info("Cancelled")
+                    sys.exit(0)
+        
+            videos = iter(video_files)
+        else:
+            # Hand videos to the jobs as soon as they are found, while the scan
+            # carries on in the background, including while the model loads
+            def stream_videos() -> Iterator[Path]:
+                for video_file, has_subtitle in scan_in_background(found):
+                    if has_subtitle:
+                        skipped_files.append(video_file)
+                        logger.info(f"Skipping {video_file.name} (subtitle already exists)")
+                    else:
+                        yield video_file
+        
+            videos = stream_videos()
     
-    # Filter out files that already have subtitles (default behavior)
-    if not args.override_existing:
-        filtered_files = []
-        for video_file in video_files:
-            subtitle_file = video_file.with_suffix('.srt')
-            if not subtitle_file.exists():
-                filtered_files.append(video_file)
+        # Don't load the model until there is at least one video to process
+        first_video = next(videos, None)
+        if first_video is None:
+            if skipped_files:
+                logger.info("All video files already have subtitles")
+                logger.info("Use --override-existing to regenerate existing subtitles")
             else:
-                print(f"Skipping {video_file.name} (subtitle already exists)")
-        video_files = filtered_files
-        
-        if not video_files:
-            print("All video files already have subtitles")
-            print("Use --override-existing to regenerate existing subtitles")
+                logger.info("No video files found")
             sys.exit(0)
     
-    # Show what will be processed
-    print(f"\nWill process {len(video_files)} video file(s) with model '{args.model}':")
-    for video_file in video_files:
-        print(f"  - {video_file}")
+        # Process video files
+        logger.info(f"\nGenerating subtitles using Whisper model '{args.model}'...")
+        successful = 0
+        failed = 0
     
-    if args.dry_run:
-        print("\nDry run complete - no subtitles were generated")
-        sys.exit(0)
+        # Only transcription needs the GPU, so it may run fewer videos at once
+        # than are being decoded and written
+        slots = min(args.gpu_slots or args.jobs, args.jobs)
+        gpu_slots = get_gpu_slots(args.model, args.batch_size)
+        if gpu_slots and slots > len(gpu_slots):
+            logger.info(f"Limiting to {len(gpu_slots)} concurrent transcription(s) to fit in GPU memory")
+            slots = len(gpu_slots)
     
-    # Confirm processing
-    if len(video_files) > 1:
-        response = input(f"\nProceed with generating subtitles? [y/N]: ")
-        if response.lower() not in ['y', 'yes']:
-            print("Cancelled")
-            sys.exit(0)
+        # The model is loaded once and shared by all jobs; each GPU gets enough
+        # workers for its round-robin share of the slots
+        gpu_ids = sorted(set(gpu_slots[:slots]))
+        workers_per_device = -(-slots // len(gpu_ids)) if gpu_ids else slots
+        try:
+            model = load_model(args.model, gpu_ids, workers_per_device, args.batch_size)
+        except Exception as e:
+            logger.error(f"Error: Failed to load Whisper model '{args.model}': {e}")
+            sys.exit(1)
     
-    # Process video files
-    print(f"\nGenerating subtitles using Whisper model '{args.model}'...")
-    successful = 0
-    failed = 0
+        gpu_semaphore = threading.BoundedSemaphore(slots)
     
-    for video_file in video_files:
-        if generate_subtitle(video_file, args.model, args.language):
-            successful += 1
-        else:
-            failed += 1
+        # One extra worker decodes the next video with FFmpeg while the others
+        # keep the model busy
+        executor = ThreadPoolExecutor(max_workers=args.jobs + 1)
+        futures = []
+        try:
+            for video_file in itertools.chain([first_video], videos):
+                futures.append(executor.submit(generate_subtitle, video_file, model, args.language,
+                                               args.batch_size, gpu_semaphore))
+            for future in as_completed(futures):
+                if future.result():
+                    successful += 1
+                else:
+                    failed += 1
+        except KeyboardInterrupt:
+            # Drop the queued videos so only the ones already in progress finish
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.info("\nInterrupted - remaining videos were cancelled")
+            raise
+        executor.shutdown()
     
-    # Summary
-    print(f"\nCompleted processing {len(video_files)} video file(s)")
-    print(f"✓ Successful: {successful}")
-    if failed > 0:
-        print(f"✗ Failed: {failed}")
+        # Summary
+        logger.info(f"\nCompleted processing {len(futures)} video file(s)")
+        logger.info(f"✓ Successful: {successful}")
+        if failed > 0:
+            logger.info(f"✗ Failed: {failed}")
     
-    sys.exit(0 if failed == 0 else 1)
+        sys.exit(0 if failed == 0 else 1)
+    finally:
+        scan_stop.set()
 
 if __name__ == '__main__':
     main()